@@ -1,14 +1,67 @@
 """
 Authentication and authorization utilities
+
+Bearer tokens are verified locally against Keycloak's cached signing keys.
+Keep it that way: never call the token introspection endpoint on the request
+path, as that adds a Keycloak round-trip to every API call. The only network
+access during verification is the JWKS fetch, which is cached and refreshed
+in the background.
 """
-from fastapi import HTTPException, Header
-from jose import jwt, JWTError
+from fastapi import Depends, HTTPException, Header
+import jwt
+from jwt.algorithms import RSAAlgorithm
+from jwt.exceptions import InvalidKeyError
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+from cachetools import TTLCache
 import httpx
 from typing import Optional
 from app.config import settings
-import json
+from app.http import http_client
+import orjson
+import asyncio
+import hashlib
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# OpenID Connect endpoints, built once from static configuration
+_OIDC_BASE = f"{settings.keycloak_url}/realms/{settings.keycloak_realm}/protocol/openid-connect"
+_TOKEN_URL = f"{_OIDC_BASE}/token"
+_JWKS_URL = f"{_OIDC_BASE}/certs"
+
+# Keycloak signing keys rarely rotate, so the JWKS document is cached per realm as
+# (etag, expires_at, jwks). The lifetime follows Cache-Control max-age when Keycloak sends one.
+JWKS_CACHE_TTL = 600  # seconds, used when the response has no max-age
+JWKS_MIN_CACHE_TTL = 60  # seconds, floor for short or zero max-age values
+JWKS_STALE_TTL = 3600  # seconds past expiry that keys are still served if Keycloak is down
+JWKS_BACKGROUND_REFRESH_MARGIN = 30  # seconds before expiry that the background task refreshes
+JWKS_BACKGROUND_RETRY_MAX_DELAY = 60  # seconds
+_JWKS_CACHE: dict[str, tuple[Optional[str], float, dict]] = {}
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+_JWKS_LOCK = asyncio.Lock()
+# Unknown kids force a refresh; this bounds how often that can hit Keycloak
+JWKS_MIN_REFRESH_INTERVAL = 10  # seconds
+_jwks_last_refresh = 0.0
+# After a failed refresh, callers get the stale keys (or the same error) without
+# retrying until this deadline; keep_jwks_fresh keeps retrying in the background
+JWKS_FAILED_REFRESH_BACKOFF = 5  # seconds
+_jwks_retry_after = 0.0
+_jwks_refresh_error: Optional[httpx.HTTPError] = None
+# Public keys built from the cached JWKS, so they are not re-parsed for every token
+_KEY_BY_KID: dict[str, RSAPublicKey] = {}
+
+# Verified token payloads, keyed by a digest of the raw token so tokens are not kept in memory.
+# Only accessed from the event loop, so no lock is needed.
+DECODED_TOKEN_CACHE_TTL = 60  # seconds
+_DECODED_TOKENS: TTLCache = TTLCache(maxsize=4096, ttl=DECODED_TOKEN_CACHE_TTL)
 
-def get_keycloak_token(username: str, password: str) -> dict:
+async def get_keycloak_token(
+    username: str,
+    password: str,
+    client: httpx.AsyncClient = http_client
+) -> dict:
     """
     Authenticate with Keycloak and get tokens
     
@@ -20,8 +73,6 @@ def get_keycloak_token(username: str, password: str) -> dict:
             "expires_in": 300
         }
     """
-    token_url = f"{settings.keycloak_url}/realms/{settings.keycloak_realm}/protocol/openid-connect/token"
-    
     data = {
         "client_id": settings.keycloak_client_id,
         "client_secret": settings.keycloak_client_secret,
@@ -31,23 +82,23 @@ def get_keycloak_token(username: str, password: str) -> dict:
     }
     
     try:
-        with httpx.Client() as client:
-            response = client.post(token_url, data=data)
-            response.raise_for_status()
-            return response.json()
+        response = await client.post(_TOKEN_URL, data=data)
+        response.raise_for_status()
+        return orjson.loads(response.content)
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         raise HTTPException(status_code=500, detail="Authentication failed")
 
-def refresh_keycloak_token(refresh_token: str) -> dict:
+async def refresh_keycloak_token(
+    refresh_token: str,
+    client: httpx.AsyncClient = http_client
+) -> dict:
     """
     Refresh access token using refresh token
     
     Returns new access_token and refresh_token
     """
-    token_url = f"{settings.keycloak_url}/realms/{settings.keycloak_realm}/protocol/openid-connect/token"
-    
     data = {
         "client_id": settings.keycloak_client_id,
         "client_secret": settings.keycloak_client_secret,
@@ -56,80 +107,226 @@ def refresh_keycloak_token(refresh_token: str) -> dict:
     }
     
     try:
-        with httpx.Client() as client:
-            response = client.post(token_url, data=data)
-            response.raise_for_status()
-            return response.json()
+        response = await client.post(_TOKEN_URL, data=data)
+        response.raise_for_status()
+        return orjson.loads(response.content)
     except httpx.HTTPStatusError:
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
-def get_jwks() -> dict:
-    """Get Keycloak public keys for JWT verification"""
-    jwks_url = f"{settings.keycloak_url}/realms/{settings.keycloak_realm}/protocol/openid-connect/certs"
+def _jwks_ttl(response: httpx.Response) -> int:
+    """Cache lifetime for a certs response, honoring Cache-Control max-age"""
+    match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+    if not match:
+        return JWKS_CACHE_TTL
+    return max(int(match.group(1)), JWKS_MIN_CACHE_TTL)
+
+async def _fetch_jwks(etag: Optional[str] = None) -> httpx.Response:
+    """
+    Fetch Keycloak public keys from the certs endpoint
+    
+    When etag is given the request is conditional and may return 304 Not Modified.
+    """
+    headers = {"If-None-Match": etag} if etag else {}
     
-    with httpx.Client() as client:
-        response = client.get(jwks_url)
+    response = await http_client.get(_JWKS_URL, headers=headers)
+    if response.status_code != 304:
         response.raise_for_status()
-        return response.json()
+    return response
 
-def decode_token(token: str) -> dict:
+async def _refresh_jwks(current: Optional[tuple[Optional[str], float, dict]]) -> dict:
+    """Fetch or revalidate the JWKS and store it; the caller must hold _JWKS_LOCK"""
+    global _jwks_last_refresh, _jwks_retry_after, _jwks_refresh_error
+    _jwks_last_refresh = time.monotonic()
+    
+    try:
+        response = await _fetch_jwks(etag=current[0] if current else None)
+    except httpx.HTTPError as e:
+        _jwks_retry_after = time.monotonic() + JWKS_FAILED_REFRESH_BACKOFF
+        _jwks_refresh_error = e
+        raise
+    _jwks_retry_after = 0.0
+    _jwks_refresh_error = None
+    
+    if response.status_code == 304:
+        # Keys haven't rotated, keep serving the ones we have
+        etag, jwks = current[0], current[2]
+    else:
+        etag, jwks = response.headers.get("ETag"), orjson.loads(response.content)
+        _index_signing_keys(jwks)
+    
+    _JWKS_CACHE[settings.keycloak_realm] = (etag, time.monotonic() + _jwks_ttl(response), jwks)
+    return jwks
+
+async def get_jwks(force_refresh: bool = False) -> dict:
     """
-    Decode and validate JWT token
+    Get Keycloak public keys for JWT verification
     
-    Returns decoded token payload:
-        {
-            "sub": "user_id",
-            "email": "user@example.com",
-            "preferred_username": "username",
-            "realm_access": {
-                "roles": ["realm-admin", ...]
-            }
-        }
+    Keys are cached for the max-age Keycloak advertises (JWKS_CACHE_TTL seconds
+    if it sends none) and revalidated with If-None-Match once stale. Pass
+    force_refresh=True to bypass the cache (e.g. when a token references an unknown kid);
+    forced refreshes happen at most once per JWKS_MIN_REFRESH_INTERVAL seconds.
+    If Keycloak can't be reached, expired keys are served for up to JWKS_STALE_TTL seconds.
+    
+    Concurrent callers share a single in-flight fetch. After a failed fetch,
+    callers skip Keycloak for JWKS_FAILED_REFRESH_BACKOFF seconds instead of
+    queueing up to retry it one after another.
     """
-    try:
-        # Get public keys
-        jwks = get_jwks()
+    realm = settings.keycloak_realm
+    cached = _JWKS_CACHE.get(realm)
+    if not force_refresh and cached and time.monotonic() < cached[1]:
+        return cached[2]
+    if time.monotonic() < _jwks_retry_after:
+        return _jwks_after_failure(cached)
+    
+    async with _JWKS_LOCK:
+        # Another task may have refreshed while we waited for the lock
+        current = _JWKS_CACHE.get(realm)
+        now = time.monotonic()
+        if current is not cached and now < current[1]:
+            return current[2]
+        # ...or failed to, in which case don't repeat the fetch
+        if now < _jwks_retry_after:
+            return _jwks_after_failure(current)
         
-        # Decode without verification first to get header
-        unverified_header = jwt.get_unverified_header(token)
+        # Don't let a stream of tokens with unknown kids hammer Keycloak
+        if force_refresh and current and now < current[1] and now - _jwks_last_refresh < JWKS_MIN_REFRESH_INTERVAL:
+            return current[2]
         
-        # Find the right key
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"]
-                }
-                break
+        try:
+            return await _refresh_jwks(current)
+        except httpx.HTTPError as e:
+            logger.warning("JWKS refresh failed: %s", e)
+            return _jwks_after_failure(current)
+
+def _jwks_after_failure(current: Optional[tuple[Optional[str], float, dict]]) -> dict:
+    """Serve still-usable stale keys after a failed refresh, or re-raise its error"""
+    if current and time.monotonic() < current[1] + JWKS_STALE_TTL:
+        return current[2]
+    raise _jwks_refresh_error
+
+async def keep_jwks_fresh() -> None:
+    """
+    Background task refreshing the JWKS shortly before it expires
+    
+    Requests then never wait on the certs endpoint. Failures are retried with
+    exponential backoff while the cached keys keep being served.
+    """
+    retry_delay = 1
+    while True:
+        cached = _JWKS_CACHE.get(settings.keycloak_realm)
+        if cached:
+            await asyncio.sleep(max(cached[1] - time.monotonic() - JWKS_BACKGROUND_REFRESH_MARGIN, 0))
         
-        if not rsa_key:
-            raise HTTPException(status_code=401, detail="Unable to find appropriate key")
+        try:
+            async with _JWKS_LOCK:
+                await _refresh_jwks(_JWKS_CACHE.get(settings.keycloak_realm))
+            retry_delay = 1
+        except Exception as e:
+            logger.warning("Background JWKS refresh failed, retrying in %ss: %s", retry_delay, e)
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, JWKS_BACKGROUND_RETRY_MAX_DELAY)
+
+def _index_signing_keys(jwks: dict) -> None:
+    """
+    Build a public key object for every signing key usable with settings.jwt_algorithm
+    
+    Realms can also publish keys for other algorithms (e.g. EC keys from an ES256
+    provider); those can never verify our tokens, so they are skipped instead of
+    failing the whole key set.
+    """
+    keys = {}
+    for key in jwks["keys"]:
+        if key.get("use", "sig") != "sig" or key.get("kty") != "RSA":
+            continue
+        if key.get("alg", settings.jwt_algorithm) != settings.jwt_algorithm:
+            continue
+        try:
+            keys[key["kid"]] = RSAAlgorithm.from_jwk(key)
+        except (InvalidKeyError, ValueError) as e:
+            logger.warning("Skipping unusable JWKS key %s: %s", key.get("kid"), e)
+    
+    _KEY_BY_KID.clear()
+    _KEY_BY_KID.update(keys)
+
+def decode_token_offline(token: str) -> Optional[dict]:
+    """
+    Decode and validate JWT token using only in-memory state
+    
+    Never touches the network. Returns None when the token's signing key
+    isn't in the key cache (JWKS not loaded yet, or keys rotated).
+    Raises HTTPException(401) for invalid tokens.
+    """
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _DECODED_TOKENS.get(cache_key)
+    # Never serve a token that expired while it was cached
+    if cached is not None and cached.get("exp", 0) > time.time():
+        return cached
+    
+    try:
+        # Decode without verification first to get header
+        unverified_header = jwt.get_unverified_header(token)
+        public_key = _KEY_BY_KID.get(unverified_header.get("kid"))
+        if public_key is None:
+            return None
         
         # Decode and verify
         payload = jwt.decode(
             token,
-            rsa_key,
+            public_key,
             algorithms=[settings.jwt_algorithm],
             audience=settings.keycloak_client_id,
             options={"verify_aud": False}  # Public client doesn't have audience
         )
-        
-        return payload
-    
-    except JWTError as e:
+    except jwt.PyJWTError as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    
+    _DECODED_TOKENS[cache_key] = payload
+    return payload
+
+async def decode_token(token: str) -> dict:
+    """
+    Decode and validate JWT token
+    
+    Returns decoded token payload:
+        {
+            "sub": "user_id",
+            "email": "user@example.com",
+            "preferred_username": "username",
+            "realm_access": {
+                "roles": ["realm-admin", ...]
+            }
+        }
+    """
+    # Returns immediately while the JWKS cache is fresh
+    await get_jwks()
+    payload = decode_token_offline(token)
+    
+    if payload is None:
+        # Unknown kid, refresh once in case the keys were rotated
+        await get_jwks(force_refresh=True)
+        payload = decode_token_offline(token)
+    
+    if payload is None:
+        raise HTTPException(status_code=401, detail="Unable to find appropriate key")
+    
+    return payload
 
-def verify_bearer_token(authorization: Optional[str] = Header(None)) -> dict:
+def get_unverified_claims(token: str) -> dict:
+    """
+    Read JWT claims without verifying the signature
+    
+    Only use this for tokens received directly from Keycloak over TLS
+    (e.g. in the login response), never for tokens sent by clients.
+    """
+    return jwt.decode(token, options={"verify_signature": False})
+
+async def verify_bearer_token(authorization: Optional[str] = Header(None)) -> dict:
     """
     Dependency to verify Bearer token from Authorization header
     
     Usage:
         @router.get("/protected")
-        def protected_route(token: dict = Depends(verify_bearer_token)):
+        async def protected_route(token: dict = Depends(verify_bearer_token)):
             return {"user": token["preferred_username"]}
     """
     if not authorization:
@@ -140,7 +337,7 @@ def verify_bearer_token(authorization: Optional[str] = Header(None)) -> dict:
     
     token = authorization.replace("Bearer ", "")
     
-    return decode_token(token)
+    return await decode_token(token)
 
 def is_superadmin(token_payload: dict) -> bool:
     """
@@ -149,17 +346,18 @@ def is_superadmin(token_payload: dict) -> bool:
     roles = token_payload.get("realm_access", {}).get("roles", [])
     return "realm-admin" in roles
 
-def require_superadmin(token_payload: dict):
+async def require_superadmin(token_payload: dict = Depends(verify_bearer_token)) -> dict:
     """
     Dependency to require realm-admin role
     
+    Resolves to the verified token payload; verification itself is served from
+    the decoded-token cache, so stacking this on verify_bearer_token is free
+    
     Usage:
         @router.post("/admin-only")
-        def admin_route(
-            token: dict = Depends(verify_bearer_token),
-            _: None = Depends(lambda t=token: require_superadmin(t))
-        ):
+        async def admin_route(token: dict = Depends(require_superadmin)):
             return {"message": "Admin access granted"}
     """
     if not is_superadmin(token_payload):
         raise HTTPException(status_code=403, detail="Requires realm-admin role")
+    return token_payload
@@ -0,0 +1,87 @@
+"""
+In-process cache for read-mostly Keycloak lookups
+"""
+import httpx
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import functools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Entries are fresh for CACHE_TTL seconds; past that they are only served when
+# Keycloak is unreachable, for up to CACHE_STALE_TTL seconds after being stored
+CACHE_TTL = 30  # seconds
+CACHE_STALE_TTL = 300  # seconds
+CACHE_MAX_ENTRIES = 1024
+
+_entries: Dict[str, Tuple[float, Any]] = {}
+# Bumped on every invalidation so a fetch that started before a write
+# cannot store its (now outdated) result afterwards
+_generation = 0
+
+def _keycloak_unavailable(exc: Exception) -> bool:
+    """Whether a failure means Keycloak is down rather than the request being wrong"""
+    # Wrapped admin API errors keep the original httpx error as their cause
+    if not isinstance(exc, httpx.HTTPError) and isinstance(exc.__cause__, httpx.HTTPError):
+        exc = exc.__cause__
+    if isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code >= 500
+
+def _store(key: str, value: Any) -> None:
+    _entries.pop(key, None)
+    if len(_entries) >= CACHE_MAX_ENTRIES:
+        # Dicts keep insertion order, so the first key is the oldest entry
+        del _entries[next(iter(_entries))]
+    _entries[key] = (time.monotonic(), value)
+
+def invalidate(*keys: str) -> None:
+    """Drop the given keys"""
+    global _generation
+    _generation += 1
+    for key in keys:
+        _entries.pop(key, None)
+
+def invalidate_prefix(prefix: str) -> None:
+    """Drop every key starting with prefix"""
+    global _generation
+    _generation += 1
+    for key in [key for key in _entries if key.startswith(prefix)]:
+        del _entries[key]
+
+def cached(key: Callable[..., str], ttl: float = CACHE_TTL):
+    """
+    Cache an async function's result under key(*args, **kwargs)
+    
+    Cached values are shared between callers and must not be mutated.
+    
+    Usage:
+        @cached(key=lambda user_id: f"users:{user_id}:roles")
+        async def get_user_roles(user_id: str) -> List[dict]:
+            ...
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            entry: Optional[Tuple[float, Any]] = _entries.get(cache_key)
+            if entry and time.monotonic() - entry[0] < ttl:
+                return entry[1]
+            
+            generation = _generation
+            try:
+                value = await func(*args, **kwargs)
+            except Exception as e:
+                if entry and _keycloak_unavailable(e) and time.monotonic() - entry[0] < CACHE_STALE_TTL:
+                    logger.warning("Serving stale %s, Keycloak unavailable: %s", cache_key, e)
+                    return entry[1]
+                raise
+            
+            if generation == _generation:
+                _store(cache_key, value)
+            return value
+        
+        return wrapper
+    
+    return decorator
@@ -0,0 +1,40 @@
+"""
+Conditional GET support for read endpoints
+"""
+from fastapi import Request, Response
+import orjson
+from typing import Any, Optional
+import hashlib
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+def etag_response(request: Request, content: Any) -> Response:
+    """
+    Serialize content once, tag it with a weak ETag and answer 304 Not Modified
+    when the client's If-None-Match already matches
+    
+    Usage:
+        @router.get("/example")
+        async def example(request: Request):
+            return etag_response(request, {"items": [...]})
+    """
+    body = orjson.dumps(content)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    # Responses depend on the caller's token, so only the client may cache
+    # them and it has to revalidate each time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,32 @@
+"""
+Shared HTTP client for outbound calls to Keycloak
+"""
+import httpx
+
+# A single pooled client keeps TCP/TLS connections to Keycloak alive between
+# requests instead of opening a new connection for every call
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_keepalive_connections=50,
+        max_connections=100,
+        # Outlive short gaps between request bursts instead of httpx's 5s default
+        keepalive_expiry=30.0
+    ),
+    timeout=10.0
+)
+
+async def get_http_client() -> httpx.AsyncClient:
+    """
+    Dependency returning the shared Keycloak client
+    
+    Usage:
+        @router.post("/example")
+        async def example(client: httpx.AsyncClient = Depends(get_http_client)):
+            ...
+    """
+    return http_client
+
+async def close_http_client() -> None:
+    """Close pooled connections; called once on application shutdown"""
+    await http_client.aclose()
@@ -2,56 +2,260 @@
 Keycloak Admin API wrapper
 """
 import httpx
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 from app.config import settings
-import json
-
-def _admin_token() -> str:
-    """Get admin access token"""
-    token_url = f"{settings.keycloak_url}/realms/master/protocol/openid-connect/token"
-    data = {
-        "client_id": "admin-cli",
-        "grant_type": "password",
-        "username": settings.keycloak_admin_user,
-        "password": settings.keycloak_admin_password,
-    }
-    with httpx.Client() as client:
-        r = client.post(token_url, data=data)
-        r.raise_for_status()
-        return r.json()["access_token"]
-
-def _admin_headers() -> dict:
-    """Get headers with admin token"""
-    token = _admin_token()
-    return {
-        "Authorization": f"Bearer {token}",
+from app.http import http_client
+from app import cache
+import orjson
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Admin API endpoints, built once from static configuration
+_ADMIN_TOKEN_URL = f"{settings.keycloak_url}/realms/master/protocol/openid-connect/token"
+_REALM_BASE = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}"
+_USERS = f"{_REALM_BASE}/users"
+_GROUPS = f"{_REALM_BASE}/groups"
+_ROLES = f"{_REALM_BASE}/roles"
+
+# Refresh the admin token this many seconds before Keycloak expires it
+ADMIN_TOKEN_EXPIRY_MARGIN = 30
+# Floor for how long a token is reused, so short admin-cli token lifespans
+# can't turn renewal into a tight loop against Keycloak
+ADMIN_TOKEN_MIN_CACHE_TTL = 5  # seconds
+# Lower and upper bounds for the wait between background renewals
+BACKGROUND_MIN_DELAY = 1  # seconds
+BACKGROUND_RETRY_MAX_DELAY = 60  # seconds
+
+_admin_token_cache: Dict[str, Any] = {
+    "access_token": None,
+    "expires_at": 0.0,
+    "valid_until": 0.0,
+    "refresh_token": None,
+    "refresh_expires_at": 0.0,
+    "headers": None,
+}
+_admin_token_lock = asyncio.Lock()
+
+# Keycloak statuses that describe the caller's request and are passed through
+# as-is; any other failure is reported as a bad gateway
+_PASSTHROUGH_STATUSES = (400, 404, 409)
+
+class KeycloakAdminError(Exception):
+    """
+    A Keycloak admin API call failed
+    
+    status_code is what the API answers with; the message is Keycloak's own
+    error text when it sends one, never the request URL
+    """
+    status_code: int = 502
+    
+    def __init__(self, detail: str, status_code: Optional[int] = None):
+        super().__init__(detail)
+        if status_code is not None:
+            self.status_code = status_code
+
+def _error_detail(response: httpx.Response) -> str:
+    """Pick the human-readable message out of a Keycloak error body"""
+    try:
+        body = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        body = None
+    
+    if isinstance(body, dict):
+        message = body.get("errorMessage") or body.get("error_description") or body.get("error")
+        if message:
+            return str(message)
+    return f"Keycloak returned {response.status_code}"
+
+def _raise_for_status(response: httpx.Response) -> None:
+    """raise_for_status, but as a KeycloakAdminError chained to the httpx error"""
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        status_code = response.status_code if response.status_code in _PASSTHROUGH_STATUSES else None
+        raise KeycloakAdminError(_error_detail(response), status_code) from e
+
+async def _request_admin_token(data: dict) -> dict:
+    """POST to the master realm token endpoint"""
+    r = await http_client.post(_ADMIN_TOKEN_URL, data=data)
+    r.raise_for_status()
+    return orjson.loads(r.content)
+
+async def _renew_admin_token() -> None:
+    """
+    Renew the cached admin token; the caller must hold _admin_token_lock
+    
+    Uses the refresh token when possible, falling back to a password grant.
+    """
+    token_cache = _admin_token_cache
+    token_data = None
+    if token_cache["refresh_token"] and time.monotonic() < token_cache["refresh_expires_at"]:
+        try:
+            token_data = await _request_admin_token({
+                "client_id": "admin-cli",
+                "grant_type": "refresh_token",
+                "refresh_token": token_cache["refresh_token"],
+            })
+        except httpx.HTTPStatusError:
+            token_data = None
+    
+    if token_data is None:
+        token_data = await _request_admin_token({
+            "client_id": "admin-cli",
+            "grant_type": "password",
+            "username": settings.keycloak_admin_user,
+            "password": settings.keycloak_admin_password,
+        })
+    
+    now = time.monotonic()
+    expires_in = token_data.get("expires_in", 60)
+    token_cache["access_token"] = token_data["access_token"]
+    # Renew ADMIN_TOKEN_EXPIRY_MARGIN early, but for short lifespans keep the
+    # token for at least half of it and never less than the floor
+    token_cache["expires_at"] = now + max(
+        expires_in - ADMIN_TOKEN_EXPIRY_MARGIN,
+        expires_in / 2,
+        ADMIN_TOKEN_MIN_CACHE_TTL
+    )
+    token_cache["valid_until"] = now + expires_in
+    token_cache["refresh_token"] = token_data.get("refresh_token")
+    token_cache["refresh_expires_at"] = now + token_data.get("refresh_expires_in", 0) - ADMIN_TOKEN_EXPIRY_MARGIN
+    token_cache["headers"] = {
+        "Authorization": f"Bearer {token_cache['access_token']}",
         "Content-Type": "application/json"
     }
 
+async def _admin_token() -> str:
+    """
+    Get admin access token
+    
+    The token is cached until shortly before it expires. If renewing it fails,
+    the old token keeps being used until Keycloak would actually reject it.
+    """
+    token_cache = _admin_token_cache
+    if token_cache["access_token"] and time.monotonic() < token_cache["expires_at"]:
+        return token_cache["access_token"]
+    
+    async with _admin_token_lock:
+        # Another task may have renewed the token while we waited for the lock
+        if token_cache["access_token"] and time.monotonic() < token_cache["expires_at"]:
+            return token_cache["access_token"]
+        
+        try:
+            await _renew_admin_token()
+        except httpx.HTTPError as e:
+            if token_cache["access_token"] and time.monotonic() < token_cache["valid_until"]:
+                logger.warning("Admin token renewal failed, reusing current token: %s", e)
+                return token_cache["access_token"]
+            raise
+        
+        return token_cache["access_token"]
+
+async def keep_admin_token_fresh() -> None:
+    """
+    Background task renewing the admin token before it expires
+    
+    Requests then never wait on a token grant. Failures are retried with
+    exponential backoff while the current token keeps being served.
+    """
+    retry_delay = 1
+    while True:
+        await asyncio.sleep(max(_admin_token_cache["expires_at"] - time.monotonic(), BACKGROUND_MIN_DELAY))
+        try:
+            async with _admin_token_lock:
+                if time.monotonic() >= _admin_token_cache["expires_at"]:
+                    await _renew_admin_token()
+            retry_delay = 1
+        except Exception as e:
+            logger.warning("Background admin token renewal failed, retrying in %ss: %s", retry_delay, e)
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, BACKGROUND_RETRY_MAX_DELAY)
+
+async def _admin_headers() -> dict:
+    """
+    Get headers with admin token
+    
+    The same dict is shared by every call until the token is renewed, so callers must not mutate it.
+    """
+    await _admin_token()
+    return _admin_token_cache["headers"]
+
+async def gather_json(urls: List[str]) -> List[Any]:
+    """
+    GET several admin API URLs concurrently
+    Returns the parsed JSON bodies in the same order as urls
+    
+    Use this when a list endpoint needs per-item details, so N lookups
+    take roughly one round-trip instead of N.
+    """
+    headers = await _admin_headers()
+    
+    async def _get(url: str) -> Any:
+        response = await http_client.get(url, headers=headers)
+        _raise_for_status(response)
+        return orjson.loads(response.content)
+    
+    return list(await asyncio.gather(*(_get(url) for url in urls)))
+
 # ============= USER MANAGEMENT =============
 
-def list_users(search: Optional[str] = None) -> List[dict]:
-    """List all users in realm"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users"
-    headers = _admin_headers()
-    params = {"search": search} if search else {}
+# Page size used when walking every user, e.g. for streamed exports
+USERS_PAGE_SIZE = 500
+
+async def _get_users_page(search: Optional[str], first: int, max_results: int) -> List[dict]:
+    """Fetch one page of users, in Keycloak's brief representation"""
+    url = _USERS
+    headers = await _admin_headers()
+    params = {"briefRepresentation": "true", "first": first, "max": max_results}
+    if search:
+        params["search"] = search
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        return response.json()
+    response = await http_client.get(url, headers=headers, params=params)
+    _raise_for_status(response)
+    return orjson.loads(response.content)
+
+@cache.cached(
+    key=lambda search=None, first=0, max_results=100: f"users:list:{search or ''}:{first}:{max_results}"
+)
+async def list_users(
+    search: Optional[str] = None,
+    first: int = 0,
+    max_results: int = 100
+) -> List[dict]:
+    """List one page of users in realm, in Keycloak's brief representation"""
+    return await _get_users_page(search, first, max_results)
+
+async def iter_users(
+    search: Optional[str] = None,
+    page_size: int = USERS_PAGE_SIZE
+) -> AsyncIterator[dict]:
+    """
+    Yield every matching user, fetching one page at a time
+    
+    Only a single page is held in memory, and pages bypass the response cache.
+    """
+    first = 0
+    while True:
+        page = await _get_users_page(search, first, page_size)
+        for user in page:
+            yield user
+        if len(page) < page_size:
+            return
+        first += page_size
 
-def get_user(user_id: str) -> dict:
+async def get_user(user_id: str) -> dict:
     """Get user by ID"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}"
-    headers = _admin_headers()
+    url = f"{_USERS}/{user_id}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    response = await http_client.get(url, headers=headers)
+    _raise_for_status(response)
+    return orjson.loads(response.content)
 
-def create_user(
+async def create_user(
     username: str,
     email: str,
     first_name: str,
@@ -64,7 +268,7 @@ def create_user(
     Create new user
     Returns user ID
     """
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users"
+    url = _USERS
     
     payload = {
         "username": username,
@@ -79,44 +283,53 @@ def create_user(
     if attributes:
         payload["attributes"] = attributes
     
-    headers = _admin_headers()
-    headers["Content-Type"] = "application/json"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.post(url, headers=headers, json=payload)
-        
-        if response.status_code not in (201, 409):
-            response.raise_for_status()
-        
-        # Get user ID
-        users = client.get(url, headers=headers, params={"username": username}).json()
-        if not users:
-            raise RuntimeError("User not found after creation")
-        
-        return users[0]["id"]
+    response = await http_client.post(url, headers=headers, content=orjson.dumps(payload))
+    
+    if response.status_code not in (201, 409):
+        _raise_for_status(response)
+    
+    if response.status_code == 201:
+        cache.invalidate_prefix("users:list:")
+    
+    # Keycloak returns the new user's URL in the Location header
+    if response.status_code == 201 and "Location" in response.headers:
+        return response.headers["Location"].rsplit("/", 1)[-1]
+    
+    # User already exists, look up its ID
+    lookup = await http_client.get(url, headers=headers, params={"username": username, "exact": "true"})
+    _raise_for_status(lookup)
+    users = orjson.loads(lookup.content)
+    if not users:
+        # The conflict was on something other than the username, e.g. the email
+        raise KeycloakAdminError(_error_detail(response), 409)
+    
+    return users[0]["id"]
 
-def update_user(user_id: str, user_data: dict) -> None:
+async def update_user(user_id: str, user_data: dict) -> None:
     """Update user"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}"
-    headers = _admin_headers()
+    url = f"{_USERS}/{user_id}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.put(url, headers=headers, json=user_data)
-        response.raise_for_status()
+    response = await http_client.put(url, headers=headers, content=orjson.dumps(user_data))
+    _raise_for_status(response)
+    cache.invalidate_prefix("users:list:")
 
-def delete_user(user_id: str) -> None:
+async def delete_user(user_id: str) -> None:
     """Delete user"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}"
-    headers = _admin_headers()
+    url = f"{_USERS}/{user_id}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.delete(url, headers=headers)
-        if response.status_code not in (204, 404):
-            response.raise_for_status()
+    response = await http_client.delete(url, headers=headers)
+    if response.status_code not in (204, 404):
+        _raise_for_status(response)
+    cache.invalidate_prefix("users:list:")
+    cache.invalidate(f"users:{user_id}:roles", f"users:{user_id}:groups")
 
-def set_user_password(user_id: str, password: str, temporary: bool = False) -> None:
+async def set_user_password(user_id: str, password: str, temporary: bool = False) -> None:
     """Set user password"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/reset-password"
+    url = f"{_USERS}/{user_id}/reset-password"
     
     payload = {
         "type": "password",
@@ -124,211 +337,277 @@ def set_user_password(user_id: str, password: str, temporary: bool = False) -> N
         "temporary": temporary
     }
     
-    headers = _admin_headers()
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.put(url, headers=headers, json=payload)
-        response.raise_for_status()
+    response = await http_client.put(url, headers=headers, content=orjson.dumps(payload))
+    _raise_for_status(response)
 
 # ============= ROLE MANAGEMENT =============
 
-def list_realm_roles() -> List[dict]:
-    """Get all realm roles"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles"
-    headers = _admin_headers()
+# Realm roles rarely change, so name -> role lookups are served from the
+# cached role list; the index is rebuilt only when that list is replaced
+_roles_by_name: Dict[str, Any] = {
+    "roles": None,
+    "by_name": {}
+}
+
+@cache.cached(key=lambda: "roles:list")
+async def list_realm_roles() -> List[dict]:
+    """Get all realm roles, without their attributes"""
+    url = _ROLES
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    response = await http_client.get(url, headers=headers, params={"briefRepresentation": "true"})
+    _raise_for_status(response)
+    return orjson.loads(response.content)
 
-def get_realm_role(role_name: str) -> dict:
+async def get_realm_role(role_name: str) -> dict:
     """Get realm role by name"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles/{role_name}"
-    headers = _admin_headers()
+    url = f"{_ROLES}/{role_name}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    response = await http_client.get(url, headers=headers)
+    _raise_for_status(response)
+    return orjson.loads(response.content)
 
-def create_realm_role(role_name: str, description: Optional[str] = None) -> None:
+async def create_realm_role(role_name: str, description: Optional[str] = None) -> None:
     """Create new realm role"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles"
+    url = _ROLES
     
     payload = {"name": role_name}
     if description:
         payload["description"] = description
     
-    headers = _admin_headers()
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.post(url, headers=headers, json=payload)
-        if response.status_code not in (201, 409):
-            response.raise_for_status()
+    response = await http_client.post(url, headers=headers, content=orjson.dumps(payload))
+    if response.status_code not in (201, 409):
+        _raise_for_status(response)
+    cache.invalidate("roles:list")
 
-def delete_realm_role(role_name: str) -> None:
+async def delete_realm_role(role_name: str) -> None:
     """Delete realm role"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles/{role_name}"
-    headers = _admin_headers()
+    url = f"{_ROLES}/{role_name}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.delete(url, headers=headers)
-        if response.status_code not in (204, 404):
-            response.raise_for_status()
+    response = await http_client.delete(url, headers=headers)
+    if response.status_code not in (204, 404):
+        _raise_for_status(response)
+    
+    # Don't hand out the deleted role from the cache; it also disappears
+    # from every user's role mappings
+    cache.invalidate("roles:list")
+    cache.invalidate_prefix("users:")
 
-def get_user_roles(user_id: str) -> List[dict]:
+@cache.cached(key=lambda user_id: f"users:{user_id}:roles")
+async def get_user_roles(user_id: str) -> List[dict]:
     """Get user's realm roles"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/role-mappings/realm"
-    headers = _admin_headers()
+    url = f"{_USERS}/{user_id}/role-mappings/realm"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    response = await http_client.get(url, headers=headers)
+    _raise_for_status(response)
+    return orjson.loads(response.content)
 
-def assign_roles_to_user(user_id: str, role_names: List[str]) -> None:
-    """Assign realm roles to user"""
-    if not role_names:
-        return
+async def _realm_roles_by_name(force_refresh: bool = False) -> Dict[str, dict]:
+    """Get realm roles keyed by name, following the list_realm_roles cache"""
+    if force_refresh:
+        cache.invalidate("roles:list")
+    roles = await list_realm_roles()
     
-    headers = _admin_headers()
-    roles = []
-    
-    with httpx.Client() as client:
-        # Fetch role objects
-        for role_name in role_names:
-            if not role_name:
-                continue
-            try:
-                role_url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles/{role_name}"
-                r = client.get(role_url, headers=headers)
-                if r.status_code == 200:
-                    roles.append(r.json())
-            except Exception:
-                continue
-        
-        if not roles:
-            return
-        
-        # Assign roles
-        url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/role-mappings/realm"
-        response = client.post(url, headers=headers, json=roles)
-        
-        if response.status_code not in (204, 409):
-            response.raise_for_status()
+    if _roles_by_name["roles"] is not roles:
+        _roles_by_name["by_name"] = {role["name"]: role for role in roles}
+        _roles_by_name["roles"] = roles
+    return _roles_by_name["by_name"]
 
-def remove_roles_from_user(user_id: str, role_names: List[str]) -> None:
-    """Remove realm roles from user"""
+async def _resolve_roles(role_names: List[str]) -> List[dict]:
+    """Map role names to role objects, skipping roles that don't exist"""
+    names = [name for name in role_names if name]
+    roles_by_name = await _realm_roles_by_name()
+    
+    if any(name not in roles_by_name for name in names):
+        # The role may have been created since the cache was filled
+        roles_by_name = await _realm_roles_by_name(force_refresh=True)
+    
+    return [roles_by_name[name] for name in names if name in roles_by_name]
+
+async def _update_role_mappings(method: str, user_id: str, role_names: List[str]) -> None:
+    """
+    Add (POST) or remove (DELETE) realm role mappings in a single request;
+    Keycloak accepts the whole role array in one body
+    """
     if not role_names:
         return
     
-    headers = _admin_headers()
-    roles = []
-    
-    with httpx.Client() as client:
-        # Fetch role objects
-        for role_name in role_names:
-            try:
-                role_url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles/{role_name}"
-                r = client.get(role_url, headers=headers)
-                if r.status_code == 200:
-                    roles.append(r.json())
-            except Exception:
-                continue
-        
-        if not roles:
-            return
-        
-        # Remove roles
-        url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/role-mappings/realm"
-        response = client.delete(url, headers=headers, json=roles)
-        
-        if response.status_code not in (204, 404):
-            response.raise_for_status()
+    # Resolve names from the cached role map; Keycloak only needs id and name
+    roles = [
+        {"id": role["id"], "name": role["name"]}
+        for role in await _resolve_roles(role_names)
+    ]
+    
+    if not roles:
+        return
+    
+    url = f"{_USERS}/{user_id}/role-mappings/realm"
+    headers = await _admin_headers()
+    
+    response = await http_client.request(method, url, headers=headers, content=orjson.dumps(roles))
+    
+    # Re-adding an existing mapping or removing a missing one is not an error
+    already_done = 409 if method == "POST" else 404
+    if response.status_code not in (204, already_done):
+        _raise_for_status(response)
+    cache.invalidate(f"users:{user_id}:roles")
+
+async def assign_roles_to_user(user_id: str, role_names: List[str]) -> None:
+    """Assign realm roles to user"""
+    await _update_role_mappings("POST", user_id, role_names)
+
+async def remove_roles_from_user(user_id: str, role_names: List[str]) -> None:
+    """Remove realm roles from user"""
+    await _update_role_mappings("DELETE", user_id, role_names)
 
 # ============= GROUP MANAGEMENT =============
 
-def list_groups() -> List[dict]:
+# Group name -> (cached_at, ID). Groups can also be deleted from Keycloak's console
+# or by another worker, so entries expire like the roles cache, and an ID that
+# turns out to be gone is resolved again (see add_user_to_groups_by_name)
+GROUP_IDS_CACHE_TTL = 60  # seconds
+_group_ids: Dict[str, tuple[float, str]] = {}
+
+async def list_groups() -> List[dict]:
     """Get all groups"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/groups"
-    headers = _admin_headers()
+    url = _GROUPS
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    response = await http_client.get(url, headers=headers)
+    _raise_for_status(response)
+    return orjson.loads(response.content)
 
-def get_group(group_id: str) -> dict:
+async def get_group(group_id: str) -> dict:
     """Get group by ID"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/groups/{group_id}"
-    headers = _admin_headers()
+    url = f"{_GROUPS}/{group_id}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    response = await http_client.get(url, headers=headers)
+    _raise_for_status(response)
+    return orjson.loads(response.content)
 
-def create_group(group_name: str) -> str:
+async def create_group(group_name: str) -> str:
     """
     Create new group
     Returns group ID
     """
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/groups"
+    url = _GROUPS
     
     payload = {"name": group_name}
-    headers = _admin_headers()
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.post(url, headers=headers, json=payload)
-        
-        if response.status_code not in (201, 409):
-            response.raise_for_status()
-        
-        # Get group ID
-        groups = client.get(url, headers=headers).json()
-        for group in groups:
-            if group["name"] == group_name:
-                return group["id"]
-        
-        raise RuntimeError("Group not found after creation")
+    response = await http_client.post(url, headers=headers, content=orjson.dumps(payload))
+    
+    if response.status_code not in (201, 409):
+        _raise_for_status(response)
+    
+    # Keycloak returns the new group's URL in the Location header
+    if response.status_code == 201 and "Location" in response.headers:
+        group_id = response.headers["Location"].rsplit("/", 1)[-1]
+        _group_ids[group_name] = (time.monotonic(), group_id)
+        return group_id
+    
+    # Group already exists, look up its ID
+    group_id = await find_group_id(group_name)
+    if group_id is None:
+        raise KeycloakAdminError(_error_detail(response), 409)
+    return group_id
 
-def delete_group(group_id: str) -> None:
+async def delete_group(group_id: str) -> None:
     """Delete group"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/groups/{group_id}"
-    headers = _admin_headers()
+    url = f"{_GROUPS}/{group_id}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.delete(url, headers=headers)
-        if response.status_code not in (204, 404):
-            response.raise_for_status()
+    response = await http_client.delete(url, headers=headers)
+    if response.status_code not in (204, 404):
+        _raise_for_status(response)
+    
+    for name, (_, cached_id) in list(_group_ids.items()):
+        if cached_id == group_id:
+            del _group_ids[name]
+    # Members lose the group, so any cached membership list may be outdated
+    cache.invalidate_prefix("users:")
 
-def get_user_groups(user_id: str) -> List[dict]:
-    """Get user's groups"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/groups"
-    headers = _admin_headers()
+async def find_group_id(group_name: str) -> Optional[str]:
+    """Look up a single group's ID by exact name, without listing the realm"""
+    cached = _group_ids.get(group_name)
+    if cached and time.monotonic() - cached[0] < GROUP_IDS_CACHE_TTL:
+        return cached[1]
     
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    headers = await _admin_headers()
+    response = await http_client.get(
+        _GROUPS,
+        headers=headers,
+        params={"search": group_name, "exact": "true", "briefRepresentation": "true"}
+    )
+    _raise_for_status(response)
+    
+    # The search also matches parents of matching subgroups, so compare names
+    for group in orjson.loads(response.content):
+        if group["name"] == group_name:
+            _group_ids[group_name] = (time.monotonic(), group["id"])
+            return group["id"]
+    _group_ids.pop(group_name, None)
+    return None
+
+async def resolve_group_ids(group_names: List[str]) -> Dict[str, str]:
+    """Resolve group names to IDs concurrently, skipping names that do not exist"""
+    group_ids = await asyncio.gather(*(find_group_id(name) for name in group_names))
+    return {
+        name: group_id
+        for name, group_id in zip(group_names, group_ids)
+        if group_id is not None
+    }
+
+async def add_user_to_groups_by_name(user_id: str, group_names: List[str]) -> None:
+    """Add user to the named groups, skipping names that do not exist"""
+    group_ids = await resolve_group_ids(group_names)
+    
+    for group_name, group_id in group_ids.items():
+        try:
+            await add_user_to_group(user_id, group_id)
+        except KeycloakAdminError as e:
+            if e.status_code != 404:
+                raise
+            # The cached ID may belong to a group deleted elsewhere; resolve it once more
+            _group_ids.pop(group_name, None)
+            group_id = await find_group_id(group_name)
+            if group_id is not None:
+                await add_user_to_group(user_id, group_id)
+
+@cache.cached(key=lambda user_id: f"users:{user_id}:groups")
+async def get_user_groups(user_id: str) -> List[dict]:
+    """Get user's groups, without their attributes"""
+    url = f"{_USERS}/{user_id}/groups"
+    headers = await _admin_headers()
+    
+    response = await http_client.get(url, headers=headers, params={"briefRepresentation": "true"})
+    _raise_for_status(response)
+    return orjson.loads(response.content)
 
-def add_user_to_group(user_id: str, group_id: str) -> None:
+async def add_user_to_group(user_id: str, group_id: str) -> None:
     """Add user to group"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/groups/{group_id}"
-    headers = _admin_headers()
+    url = f"{_USERS}/{user_id}/groups/{group_id}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.put(url, headers=headers)
-        if response.status_code not in (204, 409):
-            response.raise_for_status()
+    response = await http_client.put(url, headers=headers)
+    if response.status_code not in (204, 409):
+        _raise_for_status(response)
+    cache.invalidate(f"users:{user_id}:groups")
 
-def remove_user_from_group(user_id: str, group_id: str) -> None:
+async def remove_user_from_group(user_id: str, group_id: str) -> None:
     """Remove user from group"""
-    url = f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/groups/{group_id}"
-    headers = _admin_headers()
+    url = f"{_USERS}/{user_id}/groups/{group_id}"
+    headers = await _admin_headers()
     
-    with httpx.Client() as client:
-        response = client.delete(url, headers=headers)
-        if response.status_code not in (204, 404):
-            response.raise_for_status()
+    response = await http_client.delete(url, headers=headers)
+    if response.status_code not in (204, 404):
+        _raise_for_status(response)
+    cache.invalidate(f"users:{user_id}:groups")
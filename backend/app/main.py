@@ -1,11 +1,25 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import auth, users, roles, groups
+from app.http import close_http_client
+from app.config import settings
+from app.auth import get_jwks, keep_jwks_fresh
+from app import keycloak_admin
+import asyncio
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tasks keeping the JWKS and admin token caches fresh
+_background_tasks: list[asyncio.Task] = []
 
 app = FastAPI(
     title="IAM Admin Portal API",
     version="2.0.0",
-    description="REST API for Keycloak Identity and Access Management"
+    description="REST API for Keycloak Identity and Access Management",
+    default_response_class=ORJSONResponse
 )
 
 # CORS configuration for separate frontend
@@ -22,9 +36,58 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+@app.exception_handler(keycloak_admin.KeycloakAdminError)
+async def keycloak_admin_error(request: Request, exc: keycloak_admin.KeycloakAdminError):
+    """Answer failed admin API calls with the status they map to"""
+    return ORJSONResponse({"detail": str(exc)}, status_code=exc.status_code)
+
+@app.exception_handler(httpx.HTTPError)
+async def keycloak_request_error(request: Request, exc: httpx.HTTPError):
+    """Keycloak was unreachable or rejected the admin token grant"""
+    logger.warning("Keycloak request failed: %s", exc)
+    status_code = 503 if isinstance(exc, httpx.TransportError) else 502
+    return ORJSONResponse({"detail": "Keycloak request failed"}, status_code=status_code)
+
+@app.on_event("startup")
+async def warm_up_keycloak():
+    """Resolve Keycloak and fill the JWKS and admin token caches before the first request"""
+    keycloak_url = httpx.URL(settings.keycloak_url)
+    port = keycloak_url.port or (443 if keycloak_url.scheme == "https" else 80)
+    
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(keycloak_url.host, port)
+        logger.info(
+            "Keycloak host %s resolves to %s",
+            keycloak_url.host,
+            ", ".join(sorted({address[4][0] for address in addresses}))
+        )
+    except OSError as e:
+        # Only informational; behind HTTP(S)_PROXY the host may not resolve locally
+        logger.warning("Could not resolve Keycloak host %s: %s", keycloak_url.host, e)
+    
+    try:
+        await get_jwks()
+        await keycloak_admin._admin_token()
+    except Exception as e:
+        # Keycloak may still be starting; the background tasks keep retrying
+        logger.warning("Keycloak warm-up failed: %s", e)
+    
+    _background_tasks.append(asyncio.create_task(keep_jwks_fresh()))
+    _background_tasks.append(asyncio.create_task(keycloak_admin.keep_admin_token_fresh()))
+
+@app.on_event("shutdown")
+async def shut_down():
+    """Stop the background refresh tasks and close pooled connections to Keycloak"""
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    
+    await close_http_client()
+
 # Health check endpoint
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "ok", "version": "2.0.0"}
 
 # Include API routers
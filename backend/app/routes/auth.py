@@ -3,12 +3,14 @@ Authentication endpoints
 """
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
+import httpx
 from app.auth import (
     get_keycloak_token,
     refresh_keycloak_token,
     verify_bearer_token,
-    decode_token
+    get_unverified_claims
 )
+from app.http import get_http_client
 
 router = APIRouter()
 
@@ -33,7 +35,10 @@ class UserInfo(BaseModel):
     roles: list
 
 @router.post("/auth/login")
-def login(credentials: LoginRequest):
+async def login(
+    credentials: LoginRequest,
+    client: httpx.AsyncClient = Depends(get_http_client)
+):
     """
     Authenticate user and return JWT tokens
     
@@ -57,10 +62,10 @@ def login(credentials: LoginRequest):
     ```
     """
     try:
-        token_data = get_keycloak_token(credentials.username, credentials.password)
+        token_data = await get_keycloak_token(credentials.username, credentials.password, client)
         
-        # Decode token to get user info
-        user_data = decode_token(token_data["access_token"])
+        # Keycloak just issued this token to us, so its signature needs no re-check
+        user_data = get_unverified_claims(token_data["access_token"])
         
         return {
             "access_token": token_data["access_token"],
@@ -81,7 +86,10 @@ def login(credentials: LoginRequest):
         raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
 
 @router.post("/auth/refresh")
-def refresh_token(request: RefreshRequest):
+async def refresh_token(
+    request: RefreshRequest,
+    client: httpx.AsyncClient = Depends(get_http_client)
+):
     """
     Refresh access token using refresh token
     
@@ -103,10 +111,10 @@ def refresh_token(request: RefreshRequest):
     ```
     """
     try:
-        token_data = refresh_keycloak_token(request.refresh_token)
+        token_data = await refresh_keycloak_token(request.refresh_token, client)
         
-        # Decode token to get user info
-        user_data = decode_token(token_data["access_token"])
+        # Keycloak just issued this token to us, so its signature needs no re-check
+        user_data = get_unverified_claims(token_data["access_token"])
         
         return {
             "access_token": token_data["access_token"],
@@ -127,7 +135,7 @@ def refresh_token(request: RefreshRequest):
         raise HTTPException(status_code=401, detail=f"Token refresh failed: {str(e)}")
 
 @router.get("/auth/me", response_model=UserInfo)
-def get_current_user(token: dict = Depends(verify_bearer_token)):
+async def get_current_user(token: dict = Depends(verify_bearer_token)):
     """
     Get current user information from token
     
@@ -154,7 +162,7 @@ def get_current_user(token: dict = Depends(verify_bearer_token)):
     )
 
 @router.post("/auth/logout")
-def logout(token: dict = Depends(verify_bearer_token)):
+async def logout(token: dict = Depends(verify_bearer_token)):
     """
     Logout user (client should delete tokens)
     
@@ -1,7 +1,7 @@
 """
 Group management endpoints
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from typing import List, Optional
 from app.auth import verify_bearer_token, require_superadmin
@@ -25,7 +25,7 @@ class GroupAssignRequest(BaseModel):
     group_id: str
 
 @router.get("/groups", response_model=GroupListResponse)
-def list_groups(token: dict = Depends(verify_bearer_token)):
+async def list_groups(token: dict = Depends(verify_bearer_token)):
     """
     List all groups
     
@@ -50,27 +50,23 @@ def list_groups(token: dict = Depends(verify_bearer_token)):
     }
     ```
     """
-    try:
-        groups = keycloak_admin.list_groups()
-        
-        group_list = [
-            GroupResponse(
-                id=group["id"],
-                name=group["name"],
-                path=group.get("path", f"/{group['name']}")
-            )
-            for group in groups
-        ]
-        
-        return GroupListResponse(groups=group_list, total=len(group_list))
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list groups: {str(e)}")
+    groups = await keycloak_admin.list_groups()
+    
+    group_list = [
+        GroupResponse(
+            id=group["id"],
+            name=group["name"],
+            path=group.get("path", f"/{group['name']}")
+        )
+        for group in groups
+    ]
+    
+    return GroupListResponse(groups=group_list, total=len(group_list))
 
 @router.post("/groups", status_code=201)
-def create_group(
+async def create_group(
     group: GroupCreateRequest,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Create new group
@@ -97,24 +93,17 @@ def create_group(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        group_id = keycloak_admin.create_group(group.name)
-        
-        return {
-            "group_id": group_id,
-            "message": "Group created successfully"
-        }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create group: {str(e)}")
+    group_id = await keycloak_admin.create_group(group.name)
+    
+    return {
+        "group_id": group_id,
+        "message": "Group created successfully"
+    }
 
 @router.delete("/groups/{group_id}", status_code=204)
-def delete_group(
+async def delete_group(
     group_id: str,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Delete group
@@ -131,20 +120,13 @@ def delete_group(
     
     **Response:** 204 No Content
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.delete_group(group_id)
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete group: {str(e)}")
+    await keycloak_admin.delete_group(group_id)
 
 @router.put("/users/{user_id}/groups/{group_id}")
-def add_user_to_group(
+async def add_user_to_group(
     user_id: str,
     group_id: str,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Add user to group
@@ -167,22 +149,15 @@ def add_user_to_group(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.add_user_to_group(user_id, group_id)
-        
-        return {"message": "User added to group successfully"}
+    await keycloak_admin.add_user_to_group(user_id, group_id)
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to add user to group: {str(e)}")
+    return {"message": "User added to group successfully"}
 
 @router.delete("/users/{user_id}/groups/{group_id}")
-def remove_user_from_group(
+async def remove_user_from_group(
     user_id: str,
     group_id: str,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Remove user from group
@@ -205,13 +180,6 @@ def remove_user_from_group(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.remove_user_from_group(user_id, group_id)
-        
-        return {"message": "User removed from group successfully"}
+    await keycloak_admin.remove_user_from_group(user_id, group_id)
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to remove user from group: {str(e)}")
+    return {"message": "User removed from group successfully"}
@@ -1,15 +1,18 @@
 """
 Role management endpoints
 """
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Request
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from app.auth import verify_bearer_token, require_superadmin
 from app import keycloak_admin
+from app.etag import etag_response
 
 router = APIRouter()
 
 class RoleResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
     id: str
     name: str
     description: Optional[str] = None
@@ -27,7 +30,7 @@ class RoleAssignRequest(BaseModel):
     roles: List[str]
 
 @router.get("/roles", response_model=RoleListResponse)
-def list_roles(token: dict = Depends(verify_bearer_token)):
+async def list_roles(request: Request, token: dict = Depends(verify_bearer_token)):
     """
     List all realm roles
     
@@ -53,28 +56,26 @@ def list_roles(token: dict = Depends(verify_bearer_token)):
     }
     ```
     """
-    try:
-        roles = keycloak_admin.list_realm_roles()
-        
-        role_list = [
-            RoleResponse(
-                id=role["id"],
-                name=role["name"],
-                description=role.get("description"),
-                composite=role.get("composite", False)
-            )
-            for role in roles
-        ]
-        
-        return RoleListResponse(roles=role_list, total=len(role_list))
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list roles: {str(e)}")
+    roles = await keycloak_admin.list_realm_roles()
+    
+    # RoleListResponse only documents the shape; rows are plain dicts that
+    # orjson encodes directly, with no model objects in between
+    role_list = [
+        {
+            "id": role["id"],
+            "name": role["name"],
+            "description": role.get("description"),
+            "composite": role.get("composite", False)
+        }
+        for role in roles
+    ]
+    
+    return etag_response(request, {"roles": role_list, "total": len(role_list)})
 
 @router.post("/roles", status_code=201)
-def create_role(
+async def create_role(
     role: RoleCreateRequest,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Create new realm role
@@ -102,24 +103,17 @@ def create_role(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.create_realm_role(role.name, role.description)
-        
-        return {
-            "message": "Role created successfully",
-            "role_name": role.name
-        }
+    await keycloak_admin.create_realm_role(role.name, role.description)
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create role: {str(e)}")
+    return {
+        "message": "Role created successfully",
+        "role_name": role.name
+    }
 
 @router.delete("/roles/{role_name}", status_code=204)
-def delete_role(
+async def delete_role(
     role_name: str,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Delete realm role
@@ -136,20 +130,13 @@ def delete_role(
     
     **Response:** 204 No Content
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.delete_realm_role(role_name)
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete role: {str(e)}")
+    await keycloak_admin.delete_realm_role(role_name)
 
 @router.post("/users/{user_id}/roles")
-def assign_roles(
+async def assign_roles(
     user_id: str,
     role_assign: RoleAssignRequest,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Assign roles to user
@@ -178,22 +165,15 @@ def assign_roles(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
+    await keycloak_admin.assign_roles_to_user(user_id, role_assign.roles)
     
-    try:
-        keycloak_admin.assign_roles_to_user(user_id, role_assign.roles)
-        
-        return {"message": "Roles assigned successfully"}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to assign roles: {str(e)}")
+    return {"message": "Roles assigned successfully"}
 
 @router.delete("/users/{user_id}/roles")
-def remove_roles(
+async def remove_roles(
     user_id: str,
     role_assign: RoleAssignRequest,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Remove roles from user
@@ -222,13 +202,6 @@ def remove_roles(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.remove_roles_from_user(user_id, role_assign.roles)
-        
-        return {"message": "Roles removed successfully"}
+    await keycloak_admin.remove_roles_from_user(user_id, role_assign.roles)
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to remove roles: {str(e)}")
+    return {"message": "Roles removed successfully"}
@@ -1,15 +1,20 @@
 """
 User management endpoints
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, EmailStr
+from typing import AsyncIterator, List, Optional
+import orjson
 from app.auth import verify_bearer_token, require_superadmin
 from app import keycloak_admin
+from app.etag import etag_response
 
 router = APIRouter()
 
 class UserResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
     id: str
     username: str
     email: str
@@ -21,6 +26,8 @@ class UserResponse(BaseModel):
 class UserListResponse(BaseModel):
     users: List[UserResponse]
     total: int
+    first: int = 0
+    max: int = 100
 
 class UserCreateRequest(BaseModel):
     username: str
@@ -42,9 +49,30 @@ class PasswordResetRequest(BaseModel):
     password: str
     temporary: bool = False
 
+def _user_row(user: dict) -> dict:
+    """Project a Keycloak user onto the UserResponse fields"""
+    return {
+        "id": user["id"],
+        "username": user.get("username", ""),
+        "email": user.get("email", ""),
+        "firstName": user.get("firstName", ""),
+        "lastName": user.get("lastName", ""),
+        "enabled": user.get("enabled", False),
+        "emailVerified": user.get("emailVerified", False)
+    }
+
+async def _ndjson_users(first_user: dict, users: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Encode users one per line as Keycloak pages arrive"""
+    yield orjson.dumps(_user_row(first_user)) + b"\n"
+    async for user in users:
+        yield orjson.dumps(_user_row(user)) + b"\n"
+
 @router.get("/users", response_model=UserListResponse)
-def list_users(
+async def list_users(
+    request: Request,
     search: Optional[str] = Query(None, description="Search by username or email"),
+    first: int = Query(0, ge=0, description="Offset of the first user to return"),
+    max_results: int = Query(100, alias="max", ge=1, le=1000, description="Page size"),
     token: dict = Depends(verify_bearer_token)
 ):
     """
@@ -59,6 +87,12 @@ def list_users(
     
     **Query Parameters:**
     - `search` (optional): Search term for filtering users
+    - `first` (optional): Offset of the first user to return (default 0)
+    - `max` (optional): Page size, up to 1000 (default 100)
+    
+    With `Accept: application/x-ndjson`, every matching user is streamed as
+    one JSON object per line instead; `first` and `max` are ignored. A failure
+    on a page after the first ends the stream early.
     
     **Response:**
     ```json
@@ -74,33 +108,38 @@ def list_users(
                 "emailVerified": true
             }
         ],
-        "total": 1
+        "total": 1,
+        "first": 0,
+        "max": 100
     }
     ```
     """
-    try:
-        users = keycloak_admin.list_users(search=search)
-        
-        user_list = [
-            UserResponse(
-                id=user["id"],
-                username=user.get("username", ""),
-                email=user.get("email", ""),
-                firstName=user.get("firstName", ""),
-                lastName=user.get("lastName", ""),
-                enabled=user.get("enabled", False),
-                emailVerified=user.get("emailVerified", False)
-            )
-            for user in users
-        ]
-        
-        return UserListResponse(users=user_list, total=len(user_list))
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list users: {str(e)}")
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        # Fetch the first page before the 200 goes out, so an outage at the
+        # start still reaches the exception handlers; only later pages can cut
+        # the stream short
+        users = keycloak_admin.iter_users(search=search)
+        first_user = await anext(users, None)
+        if first_user is None:
+            return Response(media_type="application/x-ndjson")
+        return StreamingResponse(_ndjson_users(first_user, users), media_type="application/x-ndjson")
+    
+    users = await keycloak_admin.list_users(search=search, first=first, max_results=max_results)
+    
+    # UserListResponse only documents the shape; rows are plain dicts that
+    # orjson encodes directly, with no model objects in between
+    user_list = [_user_row(user) for user in users]
+    
+    return etag_response(request, {
+        "users": user_list,
+        "total": len(user_list),
+        "first": first,
+        "max": max_results
+    })
 
 @router.get("/users/{user_id}", response_model=UserResponse)
-def get_user(
+async def get_user(
+    request: Request,
     user_id: str,
     token: dict = Depends(verify_bearer_token)
 ):
@@ -130,26 +169,23 @@ def get_user(
     }
     ```
     """
-    try:
-        user = keycloak_admin.get_user(user_id)
-        
-        return UserResponse(
-            id=user["id"],
-            username=user.get("username", ""),
-            email=user.get("email", ""),
-            firstName=user.get("firstName", ""),
-            lastName=user.get("lastName", ""),
-            enabled=user.get("enabled", False),
-            emailVerified=user.get("emailVerified", False)
-        )
-    
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"User not found: {str(e)}")
+    user = await keycloak_admin.get_user(user_id)
+    
+    user_response = UserResponse(
+        id=user["id"],
+        username=user.get("username", ""),
+        email=user.get("email", ""),
+        firstName=user.get("firstName", ""),
+        lastName=user.get("lastName", ""),
+        enabled=user.get("enabled", False),
+        emailVerified=user.get("emailVerified", False)
+    )
+    return etag_response(request, user_response.model_dump())
 
 @router.post("/users", status_code=201)
-def create_user(
+async def create_user(
     user: UserCreateRequest,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Create new user
@@ -183,48 +219,36 @@ def create_user(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        # Create user
-        user_id = keycloak_admin.create_user(
-            username=user.username,
-            email=user.email,
-            first_name=user.firstName,
-            last_name=user.lastName,
-            enabled=user.enabled
-        )
-        
-        # Set password
-        keycloak_admin.set_user_password(user_id, user.password, temporary=False)
-        
-        # Assign roles
-        if user.roles:
-            keycloak_admin.assign_roles_to_user(user_id, user.roles)
-        
-        # Add to groups
-        if user.groups:
-            all_groups = keycloak_admin.list_groups()
-            group_map = {g["name"]: g["id"] for g in all_groups}
-            
-            for group_name in user.groups:
-                if group_name in group_map:
-                    keycloak_admin.add_user_to_group(user_id, group_map[group_name])
-        
-        return {
-            "user_id": user_id,
-            "message": "User created successfully"
-        }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
+    # Create user
+    user_id = await keycloak_admin.create_user(
+        username=user.username,
+        email=user.email,
+        first_name=user.firstName,
+        last_name=user.lastName,
+        enabled=user.enabled
+    )
+    
+    # Set password
+    await keycloak_admin.set_user_password(user_id, user.password, temporary=False)
+    
+    # Assign roles
+    if user.roles:
+        await keycloak_admin.assign_roles_to_user(user_id, user.roles)
+    
+    # Add to groups
+    if user.groups:
+        await keycloak_admin.add_user_to_groups_by_name(user_id, user.groups)
+    
+    return {
+        "user_id": user_id,
+        "message": "User created successfully"
+    }
 
 @router.put("/users/{user_id}")
-def update_user(
+async def update_user(
     user_id: str,
     user_update: UserUpdateRequest,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Update user information
@@ -256,35 +280,19 @@ def update_user(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        # Get current user data
-        current_user = keycloak_admin.get_user(user_id)
-        
-        # Update only provided fields
-        if user_update.email is not None:
-            current_user["email"] = user_update.email
-        if user_update.firstName is not None:
-            current_user["firstName"] = user_update.firstName
-        if user_update.lastName is not None:
-            current_user["lastName"] = user_update.lastName
-        if user_update.enabled is not None:
-            current_user["enabled"] = user_update.enabled
-        
-        # Update user
-        keycloak_admin.update_user(user_id, current_user)
-        
-        return {"message": "User updated successfully"}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to update user: {str(e)}")
+    # Keycloak applies a partial representation, so send only the provided fields
+    delta = user_update.model_dump(exclude_none=True)
+    if not delta:
+        return {"message": "No changes"}
+    
+    await keycloak_admin.update_user(user_id, delta)
+    
+    return {"message": "User updated successfully"}
 
 @router.delete("/users/{user_id}", status_code=204)
-def delete_user(
+async def delete_user(
     user_id: str,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Delete user
@@ -301,19 +309,13 @@ def delete_user(
     
     **Response:** 204 No Content
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.delete_user(user_id)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(e)}")
+    await keycloak_admin.delete_user(user_id)
 
 @router.put("/users/{user_id}/password")
-def reset_password(
+async def reset_password(
     user_id: str,
     password_reset: PasswordResetRequest,
-    token: dict = Depends(verify_bearer_token)
+    token: dict = Depends(require_superadmin)
 ):
     """
     Reset user password
@@ -343,23 +345,17 @@ def reset_password(
     }
     ```
     """
-    # Check if user is superadmin
-    require_superadmin(token)
-    
-    try:
-        keycloak_admin.set_user_password(
-            user_id,
-            password_reset.password,
-            temporary=password_reset.temporary
-        )
-        
-        return {"message": "Password reset successfully"}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to reset password: {str(e)}")
+    await keycloak_admin.set_user_password(
+        user_id,
+        password_reset.password,
+        temporary=password_reset.temporary
+    )
+    
+    return {"message": "Password reset successfully"}
 
 @router.get("/users/{user_id}/roles")
-def get_user_roles(
+async def get_user_roles(
+    request: Request,
     user_id: str,
     token: dict = Depends(verify_bearer_token)
 ):
@@ -389,15 +385,12 @@ def get_user_roles(
     }
     ```
     """
-    try:
-        roles = keycloak_admin.get_user_roles(user_id)
-        return {"roles": roles}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get user roles: {str(e)}")
+    roles = await keycloak_admin.get_user_roles(user_id)
+    return etag_response(request, {"roles": roles})
 
 @router.get("/users/{user_id}/groups")
-def get_user_groups(
+async def get_user_groups(
+    request: Request,
     user_id: str,
     token: dict = Depends(verify_bearer_token)
 ):
@@ -427,9 +420,5 @@ def get_user_groups(
     }
     ```
     """
-    try:
-        groups = keycloak_admin.get_user_groups(user_id)
-        return {"groups": groups}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get user groups: {str(e)}")
+    groups = await keycloak_admin.get_user_groups(user_id)
+    return etag_response(request, {"groups": groups})
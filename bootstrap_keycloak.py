@@ -1,37 +1,65 @@
 """
 Bootstrap script to initialize Keycloak with realm, users, roles, and groups
 """
+import asyncio
 import os
+import socket
 import sys
 import time
 import httpx
+import orjson
 
 # Add parent directory to path to import from app
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import settings
 
+# One pooled client for the whole run, so requests reuse the same connection
+CLIENT = httpx.Client(base_url=settings.keycloak_url, http2=True, timeout=10.0)
+
+# Readiness polling starts fast and backs off to the old 2s interval, within
+# the same overall budget as before
+READY_TIMEOUT = 60  # seconds
+READY_INITIAL_INTERVAL = 0.25  # seconds
+READY_MAX_INTERVAL = 2.0  # seconds
+
+def _tcp_ready(host, port):
+    """Cheap check that Keycloak accepts connections before asking for health"""
+    try:
+        with socket.create_connection((host, port), timeout=0.3):
+            return True
+    except OSError:
+        return False
+
 def wait_for_keycloak():
     """Wait for Keycloak to be ready"""
     print("Waiting for Keycloak to be ready...")
-    max_retries = 30
-    retry_interval = 2
+    url = httpx.URL(settings.keycloak_url)
+    host = url.host
+    port = url.port or (443 if url.scheme == "https" else 80)
     
-    for i in range(max_retries):
-        try:
-            response = httpx.get(f"{settings.keycloak_url}/health/ready", timeout=5.0)
-            if response.status_code == 200:
-                print("Keycloak is ready!")
-                return True
-        except Exception as e:
-            if i < max_retries - 1:
-                print(f"Attempt {i+1}/{max_retries}: Keycloak not ready yet, retrying in {retry_interval}s...")
-                time.sleep(retry_interval)
-            else:
-                print(f"Failed to connect to Keycloak after {max_retries} attempts")
-                return False
+    deadline = time.monotonic() + READY_TIMEOUT
+    interval = READY_INITIAL_INTERVAL
+    attempt = 0
     
-    return False
+    while True:
+        attempt += 1
+        if _tcp_ready(host, port):
+            try:
+                response = CLIENT.get("/health/ready", timeout=2.0)
+                if response.status_code == 200:
+                    print("Keycloak is ready!")
+                    return True
+            except httpx.HTTPError:
+                pass
+        
+        if time.monotonic() + interval > deadline:
+            print(f"Failed to connect to Keycloak after {attempt} attempts")
+            return False
+        
+        print(f"Attempt {attempt}: Keycloak not ready yet, retrying in {interval:g}s...")
+        time.sleep(interval)
+        interval = min(interval * 2, READY_MAX_INTERVAL)
 
 def get_admin_token():
     """Get admin access token"""
@@ -42,24 +70,17 @@ def get_admin_token():
         "client_id": "admin-cli"
     }
     
-    response = httpx.post(
-        f"{settings.keycloak_url}/realms/master/protocol/openid-connect/token",
-        data=data,
-        timeout=10.0
+    response = CLIENT.post(
+        "/realms/master/protocol/openid-connect/token",
+        data=data
     )
     response.raise_for_status()
-    return response.json()["access_token"]
+    return orjson.loads(response.content)["access_token"]
 
-def create_realm(token):
+async def create_realm(client):
     """Create iam-realm if it doesn't exist"""
-    headers = {"Authorization": f"Bearer {token}"}
-    
     # Check if realm exists
-    response = httpx.get(
-        f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}",
-        headers=headers,
-        timeout=10.0
-    )
+    response = await client.get(f"/admin/realms/{settings.keycloak_realm}")
     
     if response.status_code == 200:
         print(f"Realm '{settings.keycloak_realm}' already exists")
@@ -76,11 +97,9 @@ def create_realm(token):
         "ssoSessionMaxLifespan": 36000
     }
     
-    response = httpx.post(
-        f"{settings.keycloak_url}/admin/realms",
-        headers=headers,
-        json=realm_data,
-        timeout=10.0
+    response = await client.post(
+        "/admin/realms",
+        json=realm_data
     )
     
     if response.status_code == 201:
@@ -88,19 +107,15 @@ def create_realm(token):
     else:
         print(f"Failed to create realm: {response.text}")
 
-def create_client(token):
+async def create_client(client):
     """Create iam-api client if it doesn't exist"""
-    headers = {"Authorization": f"Bearer {token}"}
-    
     # Get clients
-    response = httpx.get(
-        f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/clients",
-        headers=headers,
-        params={"clientId": settings.keycloak_client_id},
-        timeout=10.0
+    response = await client.get(
+        f"/admin/realms/{settings.keycloak_realm}/clients",
+        params={"clientId": settings.keycloak_client_id}
     )
     
-    if response.status_code == 200 and len(response.json()) > 0:
+    if response.status_code == 200 and len(orjson.loads(response.content)) > 0:
         print(f"Client '{settings.keycloak_client_id}' already exists")
         return
     
@@ -117,11 +132,9 @@ def create_client(token):
         "webOrigins": ["*"]
     }
     
-    response = httpx.post(
-        f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/clients",
-        headers=headers,
-        json=client_data,
-        timeout=10.0
+    response = await client.post(
+        f"/admin/realms/{settings.keycloak_realm}/clients",
+        json=client_data
     )
     
     if response.status_code == 201:
@@ -129,67 +142,130 @@ def create_client(token):
     else:
         print(f"Failed to create client: {response.text}")
 
-def create_roles(token):
-    """Create realm roles"""
-    headers = {"Authorization": f"Bearer {token}"}
+def _async_client():
+    """Async client sharing the base URL and admin token of CLIENT"""
+    return httpx.AsyncClient(
+        base_url=settings.keycloak_url,
+        http2=True,
+        timeout=10.0,
+        headers={"Authorization": CLIENT.headers["Authorization"]}
+    )
+
+async def _ensure_role(client, role):
+    """Create a single realm role, treating a conflict as already present"""
+    response = await client.post(
+        f"/admin/realms/{settings.keycloak_realm}/roles",
+        json=role
+    )
     
+    if response.status_code == 201:
+        print(f"Created role '{role['name']}'")
+    elif response.status_code == 409:
+        print(f"Role '{role['name']}' already exists")
+    else:
+        print(f"Failed to create role '{role['name']}': {response.text}")
+
+async def create_roles(client):
+    """Create realm roles"""
     roles = [
         {"name": "realm-admin", "description": "Realm administrator with full access"},
         {"name": "user-manager", "description": "Can manage users"},
         {"name": "viewer", "description": "Read-only access"}
     ]
     
-    for role in roles:
-        # Check if role exists
-        response = httpx.get(
-            f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles/{role['name']}",
-            headers=headers,
-            timeout=10.0
-        )
-        
-        if response.status_code == 200:
-            print(f"Role '{role['name']}' already exists")
-            continue
-        
-        # Create role
-        response = httpx.post(
-            f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles",
-            headers=headers,
-            json=role,
-            timeout=10.0
-        )
-        
-        if response.status_code == 201:
-            print(f"Created role '{role['name']}'")
-        else:
-            print(f"Failed to create role '{role['name']}': {response.text}")
+    await asyncio.gather(*(_ensure_role(client, role) for role in roles))
 
-def create_groups(token):
-    """Create groups"""
-    headers = {"Authorization": f"Bearer {token}"}
+async def _ensure_group(client, group_name):
+    """Create a single group, treating a conflict as already present"""
+    response = await client.post(
+        f"/admin/realms/{settings.keycloak_realm}/groups",
+        json={"name": group_name}
+    )
     
+    if response.status_code == 201:
+        print(f"Created group '{group_name}'")
+    elif response.status_code == 409:
+        print(f"Group '{group_name}' already exists")
+    else:
+        print(f"Failed to create group '{group_name}': {response.text}")
+
+async def create_groups(client):
+    """Create groups"""
     groups = ["admins", "developers", "analysts"]
     
-    for group_name in groups:
-        # Create group
-        response = httpx.post(
-            f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/groups",
-            headers=headers,
-            json={"name": group_name},
-            timeout=10.0
+    await asyncio.gather(*(_ensure_group(client, group_name) for group_name in groups))
+
+async def _ensure_user(client, user_data, role_map):
+    """Create a user, set its password and assign its roles, in that order"""
+    password = user_data.pop("password")
+    roles = user_data.pop("roles")
+    
+    # Create user; only look it up when Keycloak reports a conflict
+    response = await client.post(
+        f"/admin/realms/{settings.keycloak_realm}/users",
+        json=user_data
+    )
+    
+    if response.status_code == 201:
+        print(f"Created user '{user_data['username']}'")
+        
+        # Get user ID from location header
+        user_id = response.headers["Location"].split("/")[-1]
+    elif response.status_code == 409:
+        response = await client.get(
+            f"/admin/realms/{settings.keycloak_realm}/users",
+            params={"username": user_data["username"], "exact": "true"}
         )
+        existing = orjson.loads(response.content) if response.status_code == 200 else []
         
-        if response.status_code == 201:
-            print(f"Created group '{group_name}'")
-        elif response.status_code == 409:
-            print(f"Group '{group_name}' already exists")
+        if not existing:
+            # The conflict was on something other than the username, e.g. the email
+            print(f"Failed to create user '{user_data['username']}': conflicts with another user")
+            return
+        
+        print(f"User '{user_data['username']}' already exists")
+        user_id = existing[0]["id"]
+    else:
+        print(f"Failed to create user '{user_data['username']}': {response.text}")
+        return
+    
+    # Set password
+    password_data = {
+        "type": "password",
+        "value": password,
+        "temporary": False
+    }
+    
+    response = await client.put(
+        f"/admin/realms/{settings.keycloak_realm}/users/{user_id}/reset-password",
+        json=password_data
+    )
+    
+    if response.status_code == 204:
+        print(f"Set password for '{user_data['username']}'")
+    
+    # Assign roles in one request, resolved from the prefetched realm roles
+    role_payload = []
+    for role_name in roles:
+        if role_name in role_map:
+            role_payload.append(role_map[role_name])
         else:
-            print(f"Failed to create group '{group_name}': {response.text}")
+            print(f"Role '{role_name}' not found")
+    
+    if not role_payload:
+        return
+    
+    response = await client.post(
+        f"/admin/realms/{settings.keycloak_realm}/users/{user_id}/role-mappings/realm",
+        json=role_payload
+    )
+    
+    if response.status_code == 204:
+        assigned = ", ".join(role["name"] for role in role_payload)
+        print(f"Assigned roles '{assigned}' to '{user_data['username']}'")
 
-def create_users(token):
+async def create_users(client):
     """Create test users"""
-    headers = {"Authorization": f"Bearer {token}"}
-    
     users = [
         {
             "username": "admin",
@@ -211,81 +287,39 @@ def create_users(token):
         }
     ]
     
-    for user_data in users:
-        password = user_data.pop("password")
-        roles = user_data.pop("roles")
-        
-        # Check if user exists
-        response = httpx.get(
-            f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users",
-            headers=headers,
-            params={"username": user_data["username"], "exact": "true"},
-            timeout=10.0
-        )
-        
-        if response.status_code == 200 and len(response.json()) > 0:
-            print(f"User '{user_data['username']}' already exists")
-            user_id = response.json()[0]["id"]
-        else:
-            # Create user
-            response = httpx.post(
-                f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users",
-                headers=headers,
-                json=user_data,
-                timeout=10.0
-            )
-            
-            if response.status_code != 201:
-                print(f"Failed to create user '{user_data['username']}': {response.text}")
-                continue
-            
-            print(f"Created user '{user_data['username']}'")
-            
-            # Get user ID from location header
-            user_id = response.headers["Location"].split("/")[-1]
-        
-        # Set password
-        password_data = {
-            "type": "password",
-            "value": password,
-            "temporary": False
-        }
+    # Fetch all realm roles once instead of resolving each name per user
+    response = await client.get(
+        f"/admin/realms/{settings.keycloak_realm}/roles",
+        params={"briefRepresentation": "true"}
+    )
+    response.raise_for_status()
+    role_map = {
+        role["name"]: {"id": role["id"], "name": role["name"]}
+        for role in orjson.loads(response.content)
+    }
+    
+    await asyncio.gather(*(
+        _ensure_user(client, user_data, role_map) for user_data in users
+    ))
+
+async def provision():
+    """Create the realm, then everything that only depends on it"""
+    async with _async_client() as client:
+        # Create realm
+        print("\n2. Creating realm...")
+        await create_realm(client)
         
-        response = httpx.put(
-            f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/reset-password",
-            headers=headers,
-            json=password_data,
-            timeout=10.0
+        # Client, roles and groups are independent of each other
+        print("\n3. Creating client, roles and groups...")
+        await asyncio.gather(
+            create_client(client),
+            create_roles(client),
+            create_groups(client)
         )
         
-        if response.status_code == 204:
-            print(f"Set password for '{user_data['username']}'")
-        
-        # Assign roles
-        for role_name in roles:
-            # Get role
-            response = httpx.get(
-                f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/roles/{role_name}",
-                headers=headers,
-                timeout=10.0
-            )
-            
-            if response.status_code != 200:
-                print(f"Role '{role_name}' not found")
-                continue
-            
-            role_data = response.json()
-            
-            # Assign role
-            response = httpx.post(
-                f"{settings.keycloak_url}/admin/realms/{settings.keycloak_realm}/users/{user_id}/role-mappings/realm",
-                headers=headers,
-                json=[{"id": role_data["id"], "name": role_data["name"]}],
-                timeout=10.0
-            )
-            
-            if response.status_code == 204:
-                print(f"Assigned role '{role_name}' to '{user_data['username']}'")
+        # Users need the roles to exist
+        print("\n4. Creating users...")
+        await create_users(client)
 
 def main():
     """Main bootstrap function"""
@@ -302,27 +336,10 @@ def main():
         # Get admin token
         print("\n1. Getting admin token...")
         token = get_admin_token()
+        CLIENT.headers["Authorization"] = f"Bearer {token}"
         print("✓ Admin token obtained")
         
-        # Create realm
-        print("\n2. Creating realm...")
-        create_realm(token)
-        
-        # Create client
-        print("\n3. Creating client...")
-        create_client(token)
-        
-        # Create roles
-        print("\n4. Creating roles...")
-        create_roles(token)
-        
-        # Create groups
-        print("\n5. Creating groups...")
-        create_groups(token)
-        
-        # Create users
-        print("\n6. Creating users...")
-        create_users(token)
+        asyncio.run(provision())
         
         print("\n" + "=" * 60)
         print("Bootstrap completed successfully!")
@@ -342,4 +359,5 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    with CLIENT:
+        main()